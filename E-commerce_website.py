@@ -3,11 +3,16 @@
 # Payment: simulated by default. Optional Stripe integration if you set STRIPE_SECRET_KEY and STRIPE_PUBLISHABLE_KEY env vars and install stripe package.
 
 import os
+import sys
 import shutil
-from flask import Flask, request, render_template, redirect, url_for, session, flash, jsonify
+import zlib
+import itertools
+from flask import Flask, Response, request, render_template, stream_template, redirect, url_for, session, flash, jsonify, get_flashed_messages
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
 from werkzeug.utils import secure_filename
-from datetime import datetime
+from datetime import datetime, timedelta
 import pathlib
 
 # Optional Stripe support (install 'stripe' package to enable)
@@ -17,6 +22,13 @@ try:
 except Exception:
     STRIPE_AVAILABLE = False
 
+# Optional Brotli support for streamed pages (install 'brotli' package to enable; gzip is always available)
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except Exception:
+    BROTLI_AVAILABLE = False
+
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
 TEMPLATES_DIR = os.path.join(APP_DIR, "templates")
 STATIC_DIR = os.path.join(APP_DIR, "static")
@@ -95,8 +107,8 @@ BASE_HTML = """<!doctype html>
       </form>
 
       <div class="header-actions">
+        <a class="btn-light" href="/cart">Cart ({{ cart_count }})</a>
         {% if session.get('user_id') %}
-          <a class="btn-light" href="/cart">Cart ({{ cart_count }})</a>
           <a class="btn-light" href="/orders">Orders</a>
           <a class="btn-light" href="/logout">Logout</a>
         {% else %}
@@ -153,21 +165,19 @@ SEARCH_HTML = """{% extends "base.html" %}
 {% block content %}
   <h2>Search results for "{{ query }}"</h2>
   <div class="grid">
-    {% if results %}
-      {% for p in results %}
-        <div class="card">
-          <img src="{{ p.image_url }}" alt="{{ p.name }}">
-          <div class="title">{{ p.name }}</div>
-          <div class="price">₹{{ "%.2f"|format(p.price) }}</div>
-          <div class="actions">
-            <a class="btn-primary" href="/add_to_cart/{{ p.id }}">Add to Cart</a>
-            <a class="btn-light" href="/product/{{ p.id }}">View</a>
-          </div>
+    {% for p in results %}
+      <div class="card">
+        <img src="{{ p.image_url }}" alt="{{ p.name }}">
+        <div class="title">{{ p.name }}</div>
+        <div class="price">₹{{ "%.2f"|format(p.price) }}</div>
+        <div class="actions">
+          <a class="btn-primary" href="/add_to_cart/{{ p.id }}">Add to Cart</a>
+          <a class="btn-light" href="/product/{{ p.id }}">View</a>
         </div>
-      {% endfor %}
+      </div>
     {% else %}
       <div class="alert">No products found.</div>
-    {% endif %}
+    {% endfor %}
   </div>
 {% endblock %}
 """
@@ -214,6 +224,10 @@ ADMIN_HTML = """{% extends "base.html" %}
     </div>
   </form>
 
+  <div style="margin-top:12px;">
+    <a class="btn-light" href="/admin/analytics">Sales analytics</a>
+  </div>
+
   <h3 style="margin-top:24px;">Existing products</h3>
   <div style="display:grid; gap:10px;">
     {% for p in products %}
@@ -234,6 +248,60 @@ ADMIN_HTML = """{% extends "base.html" %}
 with open(os.path.join(TEMPLATES_DIR, "admin.html"), "w", encoding="utf-8") as f:
     f.write(ADMIN_HTML)
 
+ANALYTICS_HTML = """{% extends "base.html" %}
+{% block content %}
+  <h2>Admin - Sales Analytics</h2>
+  <div class="small" style="color:#666">Served from rollup tables · <a href="/api/analytics">JSON</a> · <a href="/admin">Back to products</a></div>
+
+  <h3 style="margin-top:24px;">Revenue per day (last {{ stats.days }} days)</h3>
+  {% if stats.daily %}
+    <div style="display:grid; gap:6px;">
+      {% for d in stats.daily %}
+        <div style="display:flex; justify-content:space-between; background:white; padding:8px 10px; border-radius:8px;">
+          <div>{{ d.day }}</div>
+          <div class="small">{{ d.orders }} orders</div>
+          <div class="price">₹{{ "%.2f"|format(d.revenue) }}</div>
+        </div>
+      {% endfor %}
+    </div>
+  {% else %}
+    <div class="alert">No sales in this period.</div>
+  {% endif %}
+
+  <h3 style="margin-top:24px;">Top products</h3>
+  {% if stats.top_products %}
+    <div style="display:grid; gap:6px;">
+      {% for p in stats.top_products %}
+        <div style="display:flex; justify-content:space-between; background:white; padding:8px 10px; border-radius:8px;">
+          <div style="font-weight:600">{{ p.name or ('Product #' ~ p.product_id) }}</div>
+          <div class="small">{{ p.units }} units</div>
+          <div class="price">₹{{ "%.2f"|format(p.revenue) }}</div>
+        </div>
+      {% endfor %}
+    </div>
+  {% else %}
+    <div class="alert">No products sold yet.</div>
+  {% endif %}
+
+  <h3 style="margin-top:24px;">Top customers</h3>
+  {% if stats.top_users %}
+    <div style="display:grid; gap:6px;">
+      {% for u in stats.top_users %}
+        <div style="display:flex; justify-content:space-between; background:white; padding:8px 10px; border-radius:8px;">
+          <div style="font-weight:600">{{ u.name or ('User #' ~ u.user_id) }}</div>
+          <div class="small">{{ u.orders }} orders</div>
+          <div class="price">₹{{ "%.2f"|format(u.total_spent) }}</div>
+        </div>
+      {% endfor %}
+    </div>
+  {% else %}
+    <div class="alert">No customers yet.</div>
+  {% endif %}
+{% endblock %}
+"""
+with open(os.path.join(TEMPLATES_DIR, "analytics.html"), "w", encoding="utf-8") as f:
+    f.write(ANALYTICS_HTML)
+
 LOGIN_HTML = """{% extends "base.html" %}
 {% block content %}
   <h2>Login</h2>
@@ -246,7 +314,7 @@ LOGIN_HTML = """{% extends "base.html" %}
     </div>
     <div>
       <button class="btn-primary" type="submit">Login</button>
-      <a class="btn-light" href="/register">Register</a>
+      <a class="btn-light" href="/register{% if request.args.get('next') %}?next={{ request.args.get('next')|urlencode }}{% endif %}">Register</a>
     </div>
   </form>
 {% endblock %}
@@ -340,31 +408,29 @@ with open(os.path.join(TEMPLATES_DIR, "checkout.html"), "w", encoding="utf-8") a
 ORDERS_HTML = """{% extends "base.html" %}
 {% block content %}
   <h2>Your Orders</h2>
-  {% if orders %}
-    <div style="display:flex; flex-direction:column; gap:10px;">
-      {% for o in orders %}
-        <div style="background:white; padding:10px; border-radius:8px;">
-          <div style="display:flex; justify-content:space-between;">
-            <div>Order #{{ o.id }} · {{ o.created_at.strftime('%Y-%m-%d %H:%M') }}</div>
-            <div class="small">Status: {{ o.status }}</div>
-          </div>
-          <div style="margin-top:6px;">
-            {% for item in o.items %}
-              <div style="display:flex; gap:10px; margin-top:6px; align-items:center;">
-                <img src="{{ item.product.image_url }}" style="width:70px; height:60px; object-fit:cover; border-radius:6px;">
-                <div>
-                  <div style="font-weight:600;">{{ item.product.name }}</div>
-                  <div class="small">Qty: {{ item.quantity }} · ₹{{ '%.2f'|format(item.product.price * item.quantity) }}</div>
-                </div>
+  <div style="display:flex; flex-direction:column; gap:10px;">
+    {% for o in orders %}
+      <div style="background:white; padding:10px; border-radius:8px;">
+        <div style="display:flex; justify-content:space-between;">
+          <div>Order #{{ o.id }} · {{ o.created_at.strftime('%Y-%m-%d %H:%M') }}</div>
+          <div class="small">Status: {{ o.status }}</div>
+        </div>
+        <div style="margin-top:6px;">
+          {% for item in o.items %}
+            <div style="display:flex; gap:10px; margin-top:6px; align-items:center;">
+              <img src="{{ item.product.image_url }}" style="width:70px; height:60px; object-fit:cover; border-radius:6px;">
+              <div>
+                <div style="font-weight:600;">{{ item.product.name }}</div>
+                <div class="small">Qty: {{ item.quantity }} · ₹{{ '%.2f'|format(item.product.price * item.quantity) }}</div>
               </div>
-            {% endfor %}
-          </div>
+            </div>
+          {% endfor %}
         </div>
-      {% endfor %}
-    </div>
-  {% else %}
-    <div class="alert">You have no orders yet.</div>
-  {% endif %}
+      </div>
+    {% else %}
+      <div class="alert">You have no orders yet.</div>
+    {% endfor %}
+  </div>
 {% endblock %}
 """
 with open(os.path.join(TEMPLATES_DIR, "orders.html"), "w", encoding="utf-8") as f:
@@ -373,10 +439,21 @@ with open(os.path.join(TEMPLATES_DIR, "orders.html"), "w", encoding="utf-8") as
 # Flask app setup
 app = Flask(__name__)
 app.secret_key = "dev-secret-key-change-this"  # change for production
-app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:///" + os.path.join(APP_DIR, "ecommerce.db")
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URL", "sqlite:///" + os.path.join(APP_DIR, "ecommerce.db"))
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Streamed pages smaller than this many bytes are sent uncompressed
+app.config['STREAM_COMPRESS_MIN_SIZE'] = int(os.environ.get("STREAM_COMPRESS_MIN_SIZE", 1024))
 db = SQLAlchemy(app)
 
+# Catalog pages read queries in keyset batches of this many rows instead of loading them all
+QUERY_BATCH_SIZE = 100
+# Jinja yields many tiny fragments; coalesce them into chunks this big before sending/compressing
+STREAM_CHUNK_SIZE = 8192
+
+# Guest carts live in the signed session cookie; keep them small (cookies cap out around 4KB)
+GUEST_CART_MAX_LINES = 20
+GUEST_CART_MAX_QTY = 10
+
 # Database models
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -412,6 +489,23 @@ class OrderItem(db.Model):
     product_id = db.Column(db.Integer, nullable=False)
     quantity = db.Column(db.Integer, default=1)
 
+# Sales rollups - updated in the same commit as each order, so analytics
+# read a handful of rows instead of scanning Order/OrderItem
+class DailyRevenue(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+class ProductSales(db.Model):
+    product_id = db.Column(db.Integer, primary_key=True)
+    units = db.Column(db.Integer, nullable=False, default=0, index=True)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+class UserOrderStats(db.Model):
+    user_id = db.Column(db.Integer, primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    total_spent = db.Column(db.Float, nullable=False, default=0.0, index=True)
+
 # Create DB and add sample data if empty
 # Inside app.app_context() after db.create_all()
 with app.app_context():
@@ -432,30 +526,220 @@ with app.app_context():
 
 
 # Helper functions
+def guest_cart():
+    # {product_id (str, JSON keys): quantity} stored in the session cookie
+    return session.get("cart") or {}
+
 def current_cart_count():
     uid = session.get("user_id")
     if not uid:
-        return 0
+        return sum(guest_cart().values())
     items = CartItem.query.filter_by(user_id=uid).all()
     return sum([i.quantity for i in items])
 
+def merge_guest_cart(uid):
+    # Fold the session cart into CartItem: one SELECT for existing rows, one commit for all changes
+    cart = session.pop("cart", None)
+    if not cart:
+        return
+    wanted = {int(pid): qty for pid, qty in cart.items()}
+    # drop products deleted since they were added, so checkout never sees a dangling id
+    live = {pid for (pid,) in db.session.query(Product.id).filter(Product.id.in_(list(wanted)))}
+    wanted = {pid: qty for pid, qty in wanted.items() if pid in live}
+    existing = CartItem.query.filter(CartItem.user_id == uid, CartItem.product_id.in_(list(wanted))).all()
+    for it in existing:
+        it.quantity += wanted.pop(it.product_id, 0)
+    db.session.add_all([CartItem(user_id=uid, product_id=pid, quantity=qty) for pid, qty in wanted.items()])
+    db.session.commit()
+
+# Pages ?next= may send the user back to after login/register
+NEXT_ENDPOINTS = ("cart", "checkout", "orders")
+
+def next_url(default="index"):
+    # Only known pages are accepted, so ?next= can't be turned into an open redirect
+    target = request.args.get("next")
+    if target in {url_for(e) for e in NEXT_ENDPOINTS}:
+        return target
+    return url_for(default)
+
 @app.context_processor
 def inject_cart_count():
     return dict(cart_count=current_cart_count())
 
+def in_batches(query, key_col, descending=False):
+    # Keyset pagination (WHERE id > last ORDER BY id LIMIT n). Each SELECT is fully read before
+    # any row is yielded, so no cursor - and no SQLite read lock - stays open while a page streams.
+    last = None
+    while True:
+        q = query
+        if last is not None:
+            q = q.filter(key_col < last if descending else key_col > last)
+        rows = q.order_by(key_col.desc() if descending else key_col).limit(QUERY_BATCH_SIZE).all()
+        yield from rows
+        if len(rows) < QUERY_BATCH_SIZE:
+            return
+        last = getattr(rows[-1], key_col.key)
+
+def _coalesce(fragments, size):
+    buf, n = [], 0
+    for frag in fragments:
+        b = frag.encode("utf-8")
+        buf.append(b)
+        n += len(b)
+        if n >= size:
+            yield b"".join(buf)
+            buf, n = [], 0
+    if buf:
+        yield b"".join(buf)
+
+def _compress(chunks, encoding):
+    if encoding == "br":
+        c = brotli.Compressor(quality=5)
+        compress, flush, finish = c.process, c.flush, c.finish
+    else:
+        c = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+        compress, flush, finish = c.compress, (lambda: c.flush(zlib.Z_SYNC_FLUSH)), c.flush
+    for chunk in chunks:
+        # sync-flush each chunk so the browser can start parsing before the page is done
+        data = compress(chunk) + flush()
+        if data:
+            yield data
+    yield finish()
+
+def render_streamed(template_name, **context):
+    # Like render_template, but the page is sent as it renders (optionally gzip/brotli compressed).
+    # Pop flashed messages now: the session cookie is written before the body streams.
+    get_flashed_messages()
+    body = _coalesce(stream_template(template_name, **context), STREAM_CHUNK_SIZE)
+
+    # Buffer up to the threshold so small pages go out as a plain, uncompressed response
+    head, size = [], 0
+    for chunk in body:
+        head.append(chunk)
+        size += len(chunk)
+        if size >= app.config['STREAM_COMPRESS_MIN_SIZE']:
+            break
+    else:
+        resp = Response(b"".join(head), mimetype="text/html")
+        resp.vary.add("Accept-Encoding")
+        return resp
+
+    chunks = itertools.chain(head, body)
+    encoding = request.accept_encodings.best_match(["br", "gzip"] if BROTLI_AVAILABLE else ["gzip"])
+    if encoding:
+        resp = Response(_compress(chunks, encoding), mimetype="text/html")
+        resp.headers["Content-Encoding"] = encoding
+    else:
+        resp = Response(chunks, mimetype="text/html")
+    resp.vary.add("Accept-Encoding")
+    return resp
+
+def _bump_rollup(model, key_col, key, **deltas):
+    # Increment counters in SQL (col = col + x) so concurrent checkouts can't lose updates.
+    # New row: INSERT in a savepoint; if another checkout inserted it first, UPDATE instead.
+    stmt = (
+        update(model)
+        .where(key_col == key)
+        .values({getattr(model, name): getattr(model, name) + delta for name, delta in deltas.items()})
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.execute(stmt).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(model(**{key_col.key: key}, **deltas))
+    except IntegrityError:
+        db.session.execute(stmt)
+
+def record_order_rollups(order, lines):
+    # lines: list of (product_id, quantity, unit_price); caller commits
+    day = (order.created_at or datetime.utcnow()).date()
+    _bump_rollup(DailyRevenue, DailyRevenue.day, day, revenue=order.total, orders=1)
+    _bump_rollup(UserOrderStats, UserOrderStats.user_id, order.user_id, orders=1, total_spent=order.total)
+    for pid, qty, price in lines:
+        _bump_rollup(ProductSales, ProductSales.product_id, pid, units=qty, revenue=price * qty)
+
+def rebuild_rollups():
+    # Backfill: recompute every rollup from the order history in one transaction.
+    # OrderItem has no stored price, so product revenue uses current prices.
+    DailyRevenue.query.delete()
+    ProductSales.query.delete()
+    UserOrderStats.query.delete()
+
+    day_col = db.func.date(Order.created_at)
+    daily = db.session.query(day_col, db.func.sum(Order.total), db.func.count(Order.id)).group_by(day_col).all()
+    for day, revenue, count in daily:
+        if isinstance(day, str):
+            day = datetime.strptime(day, "%Y-%m-%d").date()
+        db.session.add(DailyRevenue(day=day, revenue=revenue or 0.0, orders=count))
+
+    per_product = (
+        db.session.query(
+            OrderItem.product_id,
+            db.func.sum(OrderItem.quantity),
+            db.func.sum(OrderItem.quantity * db.func.coalesce(Product.price, 0.0)),
+        )
+        .outerjoin(Product, Product.id == OrderItem.product_id)
+        .group_by(OrderItem.product_id)
+        .all()
+    )
+    for pid, units, revenue in per_product:
+        db.session.add(ProductSales(product_id=pid, units=units or 0, revenue=revenue or 0.0))
+
+    per_user = db.session.query(Order.user_id, db.func.count(Order.id), db.func.sum(Order.total)).group_by(Order.user_id).all()
+    for uid, count, spent in per_user:
+        db.session.add(UserOrderStats(user_id=uid, orders=count, total_spent=spent or 0.0))
+
+    db.session.commit()
+    return len(daily), len(per_product), len(per_user)
+
+@app.cli.command("rebuild-rollups")
+def rebuild_rollups_command():
+    """Recompute sales rollup tables from existing orders."""
+    days, products, users = rebuild_rollups()
+    print(f"Rebuilt rollups: {days} days, {products} products, {users} users")
+
+def analytics_snapshot(days=30, limit=10, customer_names=True):
+    # Bounded reads on primary keys / indexed columns only - cost does not grow with order history
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    daily = DailyRevenue.query.filter(DailyRevenue.day >= since).order_by(DailyRevenue.day.desc()).limit(days).all()
+    top_products = (
+        db.session.query(ProductSales, Product.name)
+        .outerjoin(Product, Product.id == ProductSales.product_id)
+        .order_by(ProductSales.units.desc())
+        .limit(limit)
+        .all()
+    )
+    top_users = (
+        db.session.query(UserOrderStats, User.name)
+        .outerjoin(User, User.id == UserOrderStats.user_id)
+        .order_by(UserOrderStats.total_spent.desc())
+        .limit(limit)
+        .all()
+    )
+    return {
+        "days": days,
+        "daily": [{"day": d.day.isoformat(), "revenue": d.revenue, "orders": d.orders} for d in daily],
+        "top_products": [{"product_id": ps.product_id, "name": name, "units": ps.units, "revenue": ps.revenue} for ps, name in top_products],
+        "top_users": [
+            {"user_id": us.user_id, "orders": us.orders, "total_spent": us.total_spent, **({"name": name} if customer_names else {})}
+            for us, name in top_users
+        ],
+    }
+
 # Routes
 @app.route("/")
 def index():
-    products = Product.query.all()
-    return render_template("index.html", products=products)
+    products = in_batches(Product.query, Product.id)
+    return render_streamed("index.html", products=products)
 
 @app.route("/search")
 def search():
     q = request.args.get("q", "").strip()
     results = []
     if q:
-        results = Product.query.filter(Product.name.ilike(f"%{q}%") | Product.description.ilike(f"%{q}%")).all()
-    return render_template("search.html", results=results, query=q)
+        results = in_batches(Product.query.filter(Product.name.ilike(f"%{q}%") | Product.description.ilike(f"%{q}%")), Product.id)
+    return render_streamed("search.html", results=results, query=q)
 
 @app.route("/product/<int:pid>")
 def product_view(pid):
@@ -485,8 +769,15 @@ def admin():
         db.session.commit()
         flash("Product added.")
         return redirect(url_for("admin"))
-    products = Product.query.order_by(Product.id.desc()).all()
-    return render_template("admin.html", products=products)
+    products = in_batches(Product.query, Product.id, descending=True)
+    return render_streamed("admin.html", products=products)
+
+@app.route("/admin/analytics")
+def admin_analytics():
+    if not session.get("user_id"):
+        flash("Please login.")
+        return redirect(url_for("login"))
+    return render_template("analytics.html", stats=analytics_snapshot())
 
 @app.route("/delete_product/<int:pid>")
 def delete_product(pid):
@@ -532,16 +823,18 @@ def register():
         pw2 = request.form.get("password2")
         if pw != pw2:
             flash("Passwords do not match.")
-            return redirect(url_for("register"))
+            return redirect(url_for("register", next=request.args.get("next")))
         if User.query.filter_by(email=email).first():
             flash("Email already exists.")
-            return redirect(url_for("register"))
+            return redirect(url_for("register", next=request.args.get("next")))
         u = User(name=name, email=email, password=pw)
         db.session.add(u)
         db.session.commit()
+        dest = next_url()
         session['user_id'] = u.id
+        merge_guest_cart(u.id)
         flash("Registered & logged in.")
-        return redirect(url_for("index"))
+        return redirect(dest)
     return render_template("register.html")
 
 @app.route("/login", methods=["GET", "POST"])
@@ -552,10 +845,12 @@ def login():
         u = User.query.filter_by(email=email, password=pw).first()
         if not u:
             flash("Invalid login.")
-            return redirect(url_for("login"))
+            return redirect(url_for("login", next=request.args.get("next")))
+        dest = next_url()
         session['user_id'] = u.id
+        merge_guest_cart(u.id)
         flash("Logged in.")
-        return redirect(url_for("index"))
+        return redirect(dest)
     return render_template("login.html")
 
 @app.route("/logout")
@@ -569,8 +864,22 @@ def logout():
 def add_to_cart(pid):
     uid = session.get("user_id")
     if not uid:
-        flash("Please login first.")
-        return redirect(url_for("login"))
+        # Guest: keep the cart in the session, no DB writes
+        if not Product.query.get(pid):
+            flash("Product not found.")
+            return redirect(url_for("index"))
+        cart = guest_cart()
+        key = str(pid)
+        if key not in cart and len(cart) >= GUEST_CART_MAX_LINES:
+            flash(f"Cart is full ({GUEST_CART_MAX_LINES} products max). Please login to add more.")
+            return redirect(url_for("cart"))
+        if cart.get(key, 0) >= GUEST_CART_MAX_QTY:
+            flash(f"You can add at most {GUEST_CART_MAX_QTY} of a product. Please login to add more.")
+            return redirect(url_for("cart"))
+        cart[key] = cart.get(key, 0) + 1
+        session["cart"] = cart
+        flash("Added to cart.")
+        return redirect(url_for("cart"))
     # If item exists, increment quantity else create
     it = CartItem.query.filter_by(user_id=uid, product_id=pid).first()
     if it:
@@ -585,10 +894,23 @@ def add_to_cart(pid):
 @app.route("/cart")
 def cart():
     uid = session.get("user_id")
-    if not uid:
-        flash("Please login to view cart.")
-        return redirect(url_for("login"))
-    items = CartItem.query.filter_by(user_id=uid).all()
+    if uid:
+        items = CartItem.query.filter_by(user_id=uid).all()
+    else:
+        # Guest cart from the session, shaped like CartItem rows for the loop below
+        cart = guest_cart()
+        # forget products deleted since they were added, so they stop counting towards the caps
+        live = {str(pid) for (pid,) in db.session.query(Product.id).filter(Product.id.in_([int(k) for k in cart]))}
+        if len(live) < len(cart):
+            cart = {k: q for k, q in cart.items() if k in live}
+            session["cart"] = cart
+        class Line: pass
+        items = []
+        for key, qty in cart.items():
+            it = Line()
+            it.product_id = int(key)
+            it.quantity = qty
+            items.append(it)
     # attach product object to each for template convenience
     class Wrapper: pass
     wrapped = []
@@ -596,6 +918,8 @@ def cart():
     for it in items:
         w = Wrapper()
         w.product = Product.query.get(it.product_id)
+        if not w.product:
+            continue  # product deleted since it was added
         w.quantity = it.quantity
         total += w.product.price * it.quantity
         wrapped.append(w)
@@ -605,8 +929,11 @@ def cart():
 def remove_from_cart(pid):
     uid = session.get("user_id")
     if not uid:
-        flash("Please login.")
-        return redirect(url_for("login"))
+        cart = guest_cart()
+        if cart.pop(str(pid), None) is not None:
+            session["cart"] = cart
+            flash("Removed from cart.")
+        return redirect(url_for("cart"))
     it = CartItem.query.filter_by(user_id=uid, product_id=pid).first()
     if it:
         db.session.delete(it)
@@ -619,16 +946,18 @@ def remove_from_cart(pid):
 def checkout():
     uid = session.get("user_id")
     if not uid:
-        flash("Please login.")
-        return redirect(url_for("login"))
+        flash("Please login to checkout - your cart will be kept.")
+        return redirect(url_for("login", next=url_for("checkout")))
     items = CartItem.query.filter_by(user_id=uid).all()
     if not items:
         flash("Cart is empty.")
         return redirect(url_for("cart"))
     total = 0.0
+    lines = []
     for it in items:
         p = Product.query.get(it.product_id)
         total += p.price * it.quantity
+        lines.append((it.product_id, it.quantity, p.price))
 
     # If POST -> process payment (simulated or via Stripe if configured)
     if request.method == "POST":
@@ -659,6 +988,7 @@ def checkout():
                 # clear cart
                 for it in items:
                     db.session.delete(it)
+                record_order_rollups(order, lines)
                 db.session.commit()
                 # Return client secret to front-end or redirect (we'll just show a simple message)
                 flash("PaymentIntent created in Stripe test mode. (Simulated redirect step.)")
@@ -675,6 +1005,7 @@ def checkout():
             oi = OrderItem(order_id=order.id, product_id=it.product_id, quantity=it.quantity)
             db.session.add(oi)
             db.session.delete(it)  # clear cart
+        record_order_rollups(order, lines)
         db.session.commit()
         flash("Payment simulated — order placed!")
         return redirect(url_for("orders"))
@@ -689,15 +1020,15 @@ def orders():
     if not uid:
         flash("Please login.")
         return redirect(url_for("login"))
-    orders = Order.query.filter_by(user_id=uid).order_by(Order.created_at.desc()).all()
-    # attach items and products for template display
-    grouped = []
-    for o in orders:
-        o.items = OrderItem.query.filter_by(order_id=o.id).all()
-        for it in o.items:
-            it.product = Product.query.get(it.product_id)
-        grouped.append(o)
-    return render_template("orders.html", orders=grouped)
+    # attach items and products for template display, one order at a time as the page streams
+    def grouped():
+        # newest first; ids increase with created_at
+        for o in in_batches(Order.query.filter_by(user_id=uid), Order.id, descending=True):
+            o.items = OrderItem.query.filter_by(order_id=o.id).all()
+            for it in o.items:
+                it.product = Product.query.get(it.product_id)
+            yield o
+    return render_streamed("orders.html", orders=grouped())
 
 # Small API endpoints
 @app.route("/api/products")
@@ -706,8 +1037,22 @@ def api_products():
     out = [{"id":p.id,"name":p.name,"price":p.price,"image":p.image_url} for p in prods]
     return jsonify(out)
 
+@app.route("/api/analytics")
+def api_analytics():
+    # Logged-in only, and no customer names: the JSON is easy to scrape
+    if not session.get("user_id"):
+        return jsonify({"error": "login required"}), 401
+    days = min(max(request.args.get("days", 30, type=int), 1), 365)
+    limit = min(max(request.args.get("limit", 10, type=int), 1), 100)
+    return jsonify(analytics_snapshot(days=days, limit=limit, customer_names=False))
+
 # Run
 if __name__ == "__main__":
+    # `python E-commerce_website.py rebuild-rollups` backfills analytics without starting the server
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild-rollups":
+        with app.app_context():
+            rebuild_rollups_command.main(args=sys.argv[2:], prog_name="rebuild-rollups", standalone_mode=False)
+        sys.exit(0)
     # helpful message about where the uploaded demo image came from
     if os.path.exists(UPLOADED_IMAGE_PATH):
         print("Copied demo image from:", UPLOADED_IMAGE_PATH, "-> static/img/product_demo.jpg")
@@ -0,0 +1,144 @@
+# benchmarks/bench_streaming.py - TTFB and peak RSS for catalog pages, buffered vs streamed
+# Run from the project folder:  python benchmarks/bench_streaming.py [--products 20000]
+# Uses a throwaway SQLite DB (your ecommerce.db is not touched). Linux/macOS only (uses 'resource').
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import resource
+import subprocess
+import importlib.util
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "E-commerce_website.py")
+
+
+def load_app():
+    spec = importlib.util.spec_from_file_location("shop", APP_PATH)
+    shop = importlib.util.module_from_spec(spec)
+    sys.modules["shop"] = shop  # Flask looks the module up here to find templates/static
+    spec.loader.exec_module(shop)
+    return shop
+
+
+def rss_mb():
+    # ru_maxrss is KB on Linux, bytes on macOS
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return r / (1024 * 1024) if sys.platform == "darwin" else r / 1024
+
+
+def seed(n):
+    shop = load_app()
+    with shop.app.app_context():
+        shop.db.session.bulk_insert_mappings(shop.Product, [
+            {"name": f"Bench product {i}", "price": 100.0 + i % 900,
+             "description": f"Benchmark product number {i}", "image_url": "/static/img/bench.jpg"}
+            for i in range(n)
+        ])
+        user = shop.User(name="Bench", email="bench@example.com", password="bench")
+        shop.db.session.add(user)
+        shop.db.session.commit()
+        # a few hundred orders so /orders has something to stream
+        for i in range(300):
+            order = shop.Order(user_id=user.id, total=499.0, address="-", phone="-")
+            shop.db.session.add(order)
+            shop.db.session.flush()
+            shop.db.session.add(shop.OrderItem(order_id=order.id, product_id=1 + i % n, quantity=1))
+        shop.db.session.commit()
+        return user.id
+
+
+def measure(mode, path, uid, encoding):
+    # Runs in a fresh process so peak RSS belongs to this one request
+    shop = load_app()
+    app = shop.app
+
+    if mode == "buffered":
+        # The pre-streaming views: load every row, render the whole page string, then send it
+        from flask import render_template
+
+        @app.before_request
+        def buffered_views():
+            from flask import request, session
+            if request.path == "/":
+                return render_template("index.html", products=shop.Product.query.all())
+            if request.path == "/search":
+                q = request.args.get("q", "")
+                return render_template("search.html", query=q, results=shop.Product.query.filter(
+                    shop.Product.name.ilike(f"%{q}%") | shop.Product.description.ilike(f"%{q}%")).all())
+            if request.path == "/admin":
+                return render_template("admin.html", products=shop.Product.query.order_by(shop.Product.id.desc()).all())
+            if request.path == "/orders":
+                orders = shop.Order.query.filter_by(user_id=session["user_id"]).order_by(shop.Order.created_at.desc()).all()
+                for o in orders:
+                    o.items = shop.OrderItem.query.filter_by(order_id=o.id).all()
+                    for it in o.items:
+                        it.product = shop.Product.query.get(it.product_id)
+                return render_template("orders.html", orders=orders)
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = uid
+    # warm up imports and template compilation on a small page, so the catalog page's own cost shows in RSS
+    client.get("/product/1")
+
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    resp = client.get(path, headers={"Accept-Encoding": encoding}, buffered=False)
+    body = iter(resp.response)
+    first = next(body)
+    ttfb = time.perf_counter() - start
+    size = len(first) + sum(len(chunk) for chunk in body)
+    total = time.perf_counter() - start
+    resp.close()
+    print(json.dumps({
+        "ttfb_ms": ttfb * 1000, "total_ms": total * 1000, "bytes": size,
+        "encoding": resp.headers.get("Content-Encoding", "identity"),
+        "peak_rss_mb": rss_mb(), "rss_growth_mb": rss_mb() - rss_before,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TTFB and peak RSS of catalog pages, buffered vs streamed")
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--child", nargs=4, metavar=("MODE", "PATH", "UID", "ENCODING"), help=argparse.SUPPRESS)
+    parser.add_argument("--seed", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.seed:
+        print(seed(args.products))
+        return
+    if args.child:
+        mode, path, uid, encoding = args.child
+        measure(mode, path, int(uid), encoding)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tmp, "bench.db")
+        # Seed in its own process: Linux carries ru_maxrss across fork+exec, so a parent
+        # that had loaded all the rows would inflate every child's peak RSS
+        uid = subprocess.run(
+            [sys.executable, __file__, "--seed", "--products", str(args.products)],
+            check=True, capture_output=True, text=True,
+        ).stdout.strip().splitlines()[-1]
+        runs = [("buffered", "identity"), ("streamed", "identity"), ("streamed", "gzip")]
+        if importlib.util.find_spec("brotli"):
+            runs.append(("streamed", "br"))
+
+        print(f"{args.products} products, 300 orders")
+        print(f"{'page':<18}{'mode':<10}{'encoding':<10}{'TTFB ms':>10}{'total ms':>10}{'KB sent':>10}{'peak RSS MB':>13}{'RSS growth MB':>15}")
+        for path in ["/", "/search?q=product", "/admin", "/orders"]:
+            for mode, encoding in runs:
+                out = subprocess.run(
+                    [sys.executable, __file__, "--child", mode, path, uid, encoding],
+                    check=True, capture_output=True, text=True,
+                ).stdout.strip().splitlines()[-1]
+                r = json.loads(out)
+                print(f"{path:<18}{mode:<10}{r['encoding']:<10}{r['ttfb_ms']:>10.1f}{r['total_ms']:>10.1f}"
+                      f"{r['bytes'] / 1024:>10.0f}{r['peak_rss_mb']:>13.1f}{r['rss_growth_mb']:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import os
+import sys
+import tempfile
+import importlib.util
+
+import pytest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "E-commerce_website.py")
+
+
+@pytest.fixture
+def shop(monkeypatch):
+    # Fresh copy of the app module on a throwaway SQLite DB
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "test.db")
+        monkeypatch.setenv("DATABASE_URL", "sqlite:///" + db_path)
+        spec = importlib.util.spec_from_file_location("shop", APP_PATH)
+        module = importlib.util.module_from_spec(spec)
+        monkeypatch.setitem(sys.modules, "shop", module)
+        spec.loader.exec_module(module)
+        module.db_path = db_path
+        with module.app.app_context():
+            yield module
+            module.db.session.remove()
+            module.db.engine.dispose()
+
+
+@pytest.fixture
+def client(shop):
+    return shop.app.test_client()
+
+
+@pytest.fixture
+def products(shop):
+    items = [shop.Product(name=f"Product {i}", price=10.0 * i, image_url="/static/img/x.jpg") for i in (1, 2, 3)]
+    shop.db.session.add_all(items)
+    shop.db.session.commit()
+    return [p.id for p in items]
@@ -0,0 +1,112 @@
+def guest_cart(client):
+    with client.session_transaction() as sess:
+        return dict(sess.get("cart") or {})
+
+
+def make_user(shop, email="a@example.com", password="pw"):
+    u = shop.User(name="A", email=email, password=password)
+    shop.db.session.add(u)
+    shop.db.session.commit()
+    return u.id
+
+
+def cart_rows(shop, uid):
+    shop.db.session.expire_all()
+    return {it.product_id: it.quantity for it in shop.CartItem.query.filter_by(user_id=uid)}
+
+
+def test_guest_add_view_remove(shop, client, products):
+    p1, p2, _ = products
+    client.get(f"/add_to_cart/{p1}")
+    client.get(f"/add_to_cart/{p1}")
+    client.get(f"/add_to_cart/{p2}")
+    assert guest_cart(client) == {str(p1): 2, str(p2): 1}
+    assert shop.CartItem.query.count() == 0
+
+    page = client.get("/cart").get_data(as_text=True)
+    assert "Cart (3)" in page
+    assert "Product 1" in page and "Product 2" in page
+    assert "₹40.00" in page  # 2 × 10 + 1 × 20
+
+    client.get(f"/remove_from_cart/{p1}")
+    assert guest_cart(client) == {str(p2): 1}
+
+
+def test_guest_quantity_cap_is_reported(shop, client, products):
+    pid = products[0]
+    for _ in range(shop.GUEST_CART_MAX_QTY):
+        client.get(f"/add_to_cart/{pid}", follow_redirects=True)
+    page = client.get(f"/add_to_cart/{pid}", follow_redirects=True).get_data(as_text=True)
+    assert f"at most {shop.GUEST_CART_MAX_QTY}" in page
+    assert "Added to cart." not in page
+    assert guest_cart(client) == {str(pid): shop.GUEST_CART_MAX_QTY}
+
+
+def test_guest_line_cap(shop, client, products, monkeypatch):
+    monkeypatch.setattr(shop, "GUEST_CART_MAX_LINES", 2)
+    p1, p2, p3 = products
+    client.get(f"/add_to_cart/{p1}")
+    client.get(f"/add_to_cart/{p2}")
+    page = client.get(f"/add_to_cart/{p3}", follow_redirects=True).get_data(as_text=True)
+    assert "Cart is full" in page
+    assert guest_cart(client) == {str(p1): 1, str(p2): 1}
+
+
+def test_guest_cart_forgets_deleted_products(shop, client, products):
+    p1, p2, _ = products
+    client.get(f"/add_to_cart/{p1}")
+    client.get(f"/add_to_cart/{p2}")
+    client.get(f"/delete_product/{p2}")
+
+    page = client.get("/cart").get_data(as_text=True)
+    assert "Product 2" not in page
+    assert guest_cart(client) == {str(p1): 1}
+    assert "Cart (1)" in client.get("/cart").get_data(as_text=True)
+
+
+def test_login_merges_into_existing_rows(shop, client, products):
+    p1, p2, _ = products
+    uid = make_user(shop)
+    shop.db.session.add(shop.CartItem(user_id=uid, product_id=p1, quantity=2))
+    shop.db.session.commit()
+
+    client.get(f"/add_to_cart/{p1}")
+    client.get(f"/add_to_cart/{p2}")
+    client.post("/login", data={"email": "a@example.com", "password": "pw"})
+
+    assert cart_rows(shop, uid) == {p1: 3, p2: 1}
+    assert guest_cart(client) == {}
+
+
+def test_register_merge_drops_deleted_products(shop, client, products):
+    p1, p2, _ = products
+    client.get(f"/add_to_cart/{p1}")
+    client.get(f"/add_to_cart/{p2}")
+    client.get(f"/delete_product/{p2}")
+    client.post("/register", data={"name": "B", "email": "b@example.com", "password": "pw", "password2": "pw"})
+
+    uid = shop.User.query.filter_by(email="b@example.com").one().id
+    assert cart_rows(shop, uid) == {p1: 1}
+    assert client.get("/checkout").status_code == 200
+
+
+def test_guest_checkout_returns_to_checkout_after_login(shop, client, products):
+    make_user(shop)
+    client.get(f"/add_to_cart/{products[0]}")
+    resp = client.get("/checkout")
+    assert resp.location == "/login?next=/checkout"
+    resp = client.post(resp.location, data={"email": "a@example.com", "password": "pw"})
+    assert resp.location == "/checkout"
+
+
+def test_next_rejects_unknown_targets(shop, client, products):
+    uid = make_user(shop)
+    for target in ["//evil.com", "/%09/evil.com", "/%0d%0a/x", "/\\evil.com", "https://evil.com", "/admin"]:
+        client.get("/logout")
+        client.get(f"/add_to_cart/{products[0]}")
+        resp = client.post(f"/login?next={target}", data={"email": "a@example.com", "password": "pw"})
+        assert resp.status_code == 302
+        assert resp.location == "/"
+        assert guest_cart(client) == {}
+    # each login merged its one-item guest cart exactly once
+    assert cart_rows(shop, uid) == {products[0]: 6}
@@ -0,0 +1,126 @@
+from datetime import date, datetime
+
+import pytest
+
+
+@pytest.fixture
+def buyer(shop, client):
+    client.post("/register", data={"name": "Buyer", "email": "buyer@example.com", "password": "pw", "password2": "pw"})
+    return shop.User.query.filter_by(email="buyer@example.com").one().id
+
+
+def checkout(client, *pids):
+    for pid in pids:
+        client.get(f"/add_to_cart/{pid}")
+    return client.post("/checkout", data={"address": "a", "phone": "1"})
+
+
+def rollups(shop):
+    shop.db.session.expire_all()
+    return (
+        {d.day: (d.revenue, d.orders) for d in shop.DailyRevenue.query},
+        {p.product_id: (p.units, p.revenue) for p in shop.ProductSales.query},
+        {u.user_id: (u.orders, u.total_spent) for u in shop.UserOrderStats.query},
+    )
+
+
+def test_checkout_updates_rollups(shop, client, products, buyer):
+    p1, p2, _ = products
+    checkout(client, p1, p1, p2)  # 2 × 10 + 20
+    checkout(client, p1)  # 10
+
+    daily, per_product, per_user = rollups(shop)
+    assert daily == {datetime.utcnow().date(): (50.0, 2)}
+    assert per_product == {p1: (3, 30.0), p2: (1, 20.0)}
+    assert per_user == {buyer: (2, 50.0)}
+
+
+def test_rebuild_matches_incremental_rollups(shop, client, products, buyer):
+    checkout(client, products[0], products[1])
+    checkout(client, products[0])
+    before = rollups(shop)
+
+    shop.db.session.query(shop.ProductSales).update({"units": 99})
+    shop.db.session.commit()
+    assert shop.rebuild_rollups() == (1, 2, 1)
+    assert rollups(shop) == before
+
+
+def test_rebuild_groups_orders_by_day(shop, products):
+    # SQLite returns func.date() as a 'YYYY-MM-DD' string; rebuild must turn it back into a date
+    for day, total in [(datetime(2024, 1, 1, 9), 10.0), (datetime(2024, 1, 1, 23), 5.0), (datetime(2024, 1, 2, 12), 7.0)]:
+        order = shop.Order(user_id=1, total=total, created_at=day)
+        shop.db.session.add(order)
+        shop.db.session.flush()
+        shop.db.session.add(shop.OrderItem(order_id=order.id, product_id=products[0], quantity=1))
+    shop.db.session.commit()
+
+    shop.rebuild_rollups()
+    daily, per_product, per_user = rollups(shop)
+    assert daily == {date(2024, 1, 1): (15.0, 2), date(2024, 1, 2): (7.0, 1)}
+    assert per_product == {products[0]: (3, 30.0)}
+    assert per_user == {1: (3, 22.0)}
+
+
+def test_rebuild_cli_command(shop, client, products, buyer):
+    checkout(client, products[0])
+    result = shop.app.test_cli_runner().invoke(args=["rebuild-rollups"])
+    assert result.exit_code == 0
+    assert "Rebuilt rollups: 1 days, 1 products, 1 users" in result.output
+
+
+def test_bump_rollup_inserts_then_updates(shop):
+    shop._bump_rollup(shop.UserOrderStats, shop.UserOrderStats.user_id, 7, orders=1, total_spent=2.0)
+    shop._bump_rollup(shop.UserOrderStats, shop.UserOrderStats.user_id, 7, orders=1, total_spent=3.0)
+    shop.db.session.commit()
+    assert rollups(shop)[2] == {7: (2, 5.0)}
+
+
+def test_bump_rollup_falls_back_to_update_when_insert_races(shop, monkeypatch):
+    shop.db.session.add(shop.UserOrderStats(user_id=7, orders=1, total_spent=3.0))
+    shop.db.session.commit()
+
+    # Another checkout inserted the row between our UPDATE (0 rows) and our INSERT
+    execute = shop.db.session.execute
+    calls = []
+
+    class NoRows:
+        rowcount = 0
+
+    def racing_execute(stmt, *args, **kwargs):
+        calls.append(stmt)
+        if len(calls) == 1:
+            return NoRows()
+        return execute(stmt, *args, **kwargs)
+
+    monkeypatch.setattr(shop.db.session, "execute", racing_execute)
+    shop._bump_rollup(shop.UserOrderStats, shop.UserOrderStats.user_id, 7, orders=1, total_spent=2.0)
+    monkeypatch.undo()
+    shop.db.session.commit()
+
+    assert len(calls) == 2  # skipped UPDATE, then the fallback UPDATE after the IntegrityError
+    assert rollups(shop)[2] == {7: (2, 5.0)}
+
+
+def test_analytics_requires_login(client):
+    assert client.get("/api/analytics").status_code == 401
+    resp = client.get("/admin/analytics")
+    assert resp.status_code == 302
+    assert resp.location == "/login"
+
+
+def test_api_analytics_clamps_and_hides_names(shop, client, products, buyer):
+    checkout(client, products[0], products[1], products[1])
+
+    data = client.get("/api/analytics?days=0&limit=0").get_json()
+    assert data["days"] == 1
+    assert len(data["top_products"]) == 1
+    assert data["top_products"][0]["product_id"] == products[1]
+
+    data = client.get("/api/analytics?days=10000&limit=10000").get_json()
+    assert data["days"] == 365
+    assert len(data["top_products"]) == 2
+    assert data["top_users"] == [{"user_id": buyer, "orders": 1, "total_spent": 50.0}]
+
+    page = client.get("/admin/analytics").get_data(as_text=True)
+    assert "Buyer" in page
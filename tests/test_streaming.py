@@ -0,0 +1,35 @@
+import sqlite3
+import threading
+
+
+def test_write_succeeds_while_streamed_page_is_unread(shop):
+    shop.db.session.bulk_insert_mappings(shop.Product, [
+        {"name": f"Product {i}", "price": 10.0, "image_url": "/static/img/x.jpg"}
+        for i in range(shop.QUERY_BATCH_SIZE * 5)
+    ])
+    shop.db.session.commit()
+
+    resp = shop.app.test_client().get("/", buffered=False)
+    body = iter(resp.response)
+    next(body)  # slow client: first chunk read, rest of the page still pending
+
+    errors = []
+
+    def checkout_write():
+        conn = sqlite3.connect(shop.db_path, timeout=1)
+        try:
+            conn.execute("INSERT INTO product (name, price, image_url) VALUES ('new', 1.0, 'x')")
+            conn.commit()
+        except sqlite3.OperationalError as e:
+            errors.append(e)
+        finally:
+            conn.close()
+
+    t = threading.Thread(target=checkout_write)
+    t.start()
+    t.join()
+    assert not errors
+
+    rest = b"".join(body)
+    resp.close()
+    assert b"Product %d" % (shop.QUERY_BATCH_SIZE * 5 - 1) in rest